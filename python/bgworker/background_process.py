@@ -11,11 +11,12 @@ We react to:
  - configuration changes (disable the background worker)
  - HA events (if we are a slave)
 """
+import collections
 import logging
 import logging.handlers
 import multiprocessing
 import os
-import select
+import selectors
 import socket
 import threading
 import time
@@ -26,6 +27,34 @@ import ncs
 from ncs.experimental import Subscriber
 
 
+# Background worker processes are started through a forkserver. Forking the
+# NSO Python VM directly would duplicate all of its state, while spawning
+# starts a fresh interpreter that has to import everything again on each
+# (re)start. The forkserver is a small process with just the ncs module
+# preloaded, which is forked to create each worker. Like with spawn, the
+# worker function must be picklable, i.e. a module level function.
+#
+# Note that the forkserver and its preload list are global multiprocessing
+# state, shared by all packages running in the same Python VM. Rather than
+# changing it on import, the preload is set right before we start our first
+# worker, see _set_forkserver_preload.
+_mp_ctx = multiprocessing.get_context('forkserver')
+_forkserver_preload_set = False
+
+
+def _set_forkserver_preload():
+    """Preload the ncs module in the forkserver, once
+
+    This only has an effect if the forkserver has not been started yet, by us
+    or by anyone else in this Python VM, and replaces any preload list set
+    before.
+    """
+    global _forkserver_preload_set
+    if not _forkserver_preload_set:
+        _mp_ctx.set_forkserver_preload(['ncs'])
+        _forkserver_preload_set = True
+
+
 def _get_handler_impls(logger: logging.Logger) -> typing.Iterable[logging.Handler]:
     """For a given Logger instance, find the registered handlers.
 
@@ -45,11 +74,14 @@ def _get_handler_impls(logger: logging.Logger) -> typing.Iterable[logging.Handle
             c = c.parent
 
 
-def _bg_wrapper(pipe_unused, log_q, log_config_q, log_level, bg_fun, *bg_fun_args):
+def _bg_wrapper(pipe_unused, ctrl_pipe, log_q, log_config_q, log_level, bg_fun, *bg_fun_args):
     """Internal wrapper for the background worker function.
 
     Used to set up logging via a QueueHandler in the child process. The other end
     of the queue is observed by a QueueListener in the parent process.
+
+    For a pausable worker, ctrl_pipe is the child end of the control pipe and
+    the worker function is passed a WorkerControl object as first argument.
     """
     queue_hdlr = logging.handlers.QueueHandler(log_q)
     root = logging.getLogger()
@@ -60,6 +92,9 @@ def _bg_wrapper(pipe_unused, log_q, log_config_q, log_level, bg_fun, *bg_fun_arg
     log_reconf = LogReconfigurator(log_config_q, root)
     log_reconf.start()
 
+    if ctrl_pipe is not None:
+        bg_fun_args = (WorkerControl(ctrl_pipe),) + bg_fun_args
+
     try:
         bg_fun(*bg_fun_args)
     except Exception as e:
@@ -67,6 +102,37 @@ def _bg_wrapper(pipe_unused, log_q, log_config_q, log_level, bg_fun, *bg_fun_arg
         root.debug(traceback.format_exc())
 
 
+def _ha_events_connect():
+    """Connect to the NCS notification API for HA events
+
+    HA events, like HA-mode transitions, are exposed over a notification API.
+    The returned socket can be waited upon in a select loop and the
+    notifications read from it with _ncs.events.read_notification.
+    """
+    from _ncs import events
+    event_socket = socket.socket()
+    events.notifications_connect(event_socket, events.NOTIF_HA_INFO, ip='127.0.0.1', port=ncs.PORT)
+    return event_socket
+
+
+def _ha_notification_master(notification):
+    """Return whether an HA notification means we are now HA master, or None if
+    it does not affect that
+    """
+    from _ncs import events
+    # Can this fail? Could we get a KeyError here? Afraid to catch it
+    # because I don't know what it could mean.
+    ha_notif_type = notification['hnot']['type']
+
+    if ha_notif_type == events.HA_INFO_IS_MASTER:
+        return True
+    elif ha_notif_type == events.HA_INFO_IS_NONE:
+        return False
+    elif ha_notif_type == events.HA_INFO_SLAVE_INITIALIZED:
+        return False
+    return None
+
+
 class LogReconfigurator(threading.Thread):
     def __init__(self, q, log_root):
         super(LogReconfigurator, self).__init__()
@@ -86,11 +152,37 @@ class LogReconfigurator(threading.Thread):
         self.q.put(('exit', None))
 
 
+class WorkerControl(object):
+    """Pause / resume control for the background worker function
+
+    A pausable Process passes this as the first argument to the background
+    worker function. Rather than terminating the background worker process
+    when it should no longer run, the supervisor tells it to pause and later to
+    resume. The worker function must call check() regularly, like once per
+    iteration of its main loop, which returns immediately while the worker
+    should run and blocks for as long as it is paused.
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.paused = False
+
+    def check(self):
+        while self.paused or self.conn.poll():
+            cmd = self.conn.recv()
+            self.paused = (cmd == 'pause')
+
+
 class Process(threading.Thread):
     """Supervisor for running the main background process and reacting to
     various events
+
+    By default the background worker process is terminated when it should no
+    longer run, e.g. when disabled through config or when we are no longer HA
+    master, and a new one is started when it should run again. With
+    pausable=True the background worker process is instead kept alive and told
+    to pause / resume, see WorkerControl.
     """
-    def __init__(self, app, bg_fun, bg_fun_args=None, config_path=None):
+    def __init__(self, app, bg_fun, bg_fun_args=None, config_path=None, pausable=False):
         super(Process, self).__init__()
         self.app = app
         self.bg_fun = bg_fun
@@ -98,17 +190,41 @@ class Process(threading.Thread):
             bg_fun_args = []
         self.bg_fun_args = bg_fun_args
         self.config_path = config_path
+        self.pausable = pausable
         self.parent_pipe = None
+        self.ctrl_pipe = None
+        self.worker_paused = False
 
         self.log = app.log
         self.name = "{}.{}".format(self.app.__class__.__module__,
                                    self.app.__class__.__name__)
         self.log.info("{} supervisor starting".format(self.name))
 
+        # messages for things that happen repeatedly during our lifetime
+        self._supervisor_tag = "{} (Supervisor)".format(self.name)
+        self._start_msg = "{}: starting the background worker process".format(self.name)
+        self._stop_msg = "{}: stopping the background worker process".format(self.name)
+        self._pause_msg = "{}: pausing the background worker process".format(self.name)
+        self._resume_msg = "{}: resuming the background worker process".format(self.name)
+
         self.vmid = self.app._ncs_id
 
-        self.mp_ctx = multiprocessing.get_context('spawn')
-        self.q = self.mp_ctx.Queue()
+        # all producers for this queue are threads in our own process, so no
+        # need for a multiprocessing.Queue with its pickling and feeder thread
+        self.q = WaitableQueue()
+
+        # The supervisor waits for all its input using a single selector. The
+        # queue and the HA event socket are always registered while the pipe
+        # to the background worker process is registered for as long as the
+        # worker is alive.
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.q, selectors.EVENT_READ)
+
+        # connect to the HA event notification API, the notifications are
+        # read directly by the supervisor thread. This is done before starting
+        # any threads so that a failure to connect doesn't leave them running.
+        self.ha_event_socket = _ha_events_connect()
+        self.selector.register(self.ha_event_socket, selectors.EVENT_READ)
 
         # start the config subscriber thread
         if self.config_path is not None:
@@ -117,19 +233,15 @@ class Process(threading.Thread):
             subscriber_iter.register(self.config_subscriber)
             self.config_subscriber.start()
 
-        # start the HA event listener thread
-        self.ha_event_listener = HaEventListener(app=self.app, q=self.q)
-        self.ha_event_listener.start()
-
         # start the logging QueueListener thread
         hdlrs = list(_get_handler_impls(self.app._logger))
-        self.log_queue = self.mp_ctx.Queue()
+        self.log_queue = _mp_ctx.Queue()
         self.queue_listener = logging.handlers.QueueListener(self.log_queue, *hdlrs, respect_handler_level=True)
         self.queue_listener.start()
         self.current_log_level = self.app._logger.getEffectiveLevel()
 
         # start log config CDB subscriber
-        self.log_config_q = self.mp_ctx.Queue()
+        self.log_config_q = _mp_ctx.Queue()
         self.log_config_subscriber = Subscriber(app=self.app, log=self.log)
         log_subscriber_iter = LogConfigSubscriber(self.log_config_q, self.vmid)
         log_subscriber_iter.register(self.log_config_subscriber)
@@ -137,7 +249,11 @@ class Process(threading.Thread):
 
         self.worker = None
 
-        # Read initial configuration, using two separate transactions
+        # Read initial configuration, using two separate transactions. This
+        # must happen after the HA event socket has been connected and the
+        # config subscriber started, so that any change made after our read is
+        # delivered as an event rather than lost. The transactions are kept
+        # short and only span the reads themselves.
         with ncs.maapi.Maapi() as m:
             with ncs.maapi.Session(m, '{}_supervisor'.format(self.name), 'system'):
                 # in the 1st transaction read config data from the 'enabled' leaf
@@ -168,43 +284,66 @@ class Process(threading.Thread):
 
 
     def run(self):
-        self.app.add_running_thread(self.name + ' (Supervisor)')
+        self.app.add_running_thread(self._supervisor_tag)
 
         while True:
             try:
                 should_run = self.config_enabled and (not self.ha_enabled or self.ha_master)
-
-                if should_run and (self.worker is None or not self.worker.is_alive()):
+                # The pipe to the worker is unwatched as soon as we see the
+                # worker die, so it tells us whether the worker is alive
+                # without polling it with is_alive(), i.e. waitpid().
+                worker_alive = self.parent_pipe is not None
+                # wait indefinitely for input unless we need to retry
+                timeout = None
+
+                if should_run and worker_alive and self.worker_paused:
+                    self.log.info("Background worker process should run but is paused, resuming")
+                    self.worker_resume()
+                    # resuming fails if the worker has died, start a new one
+                    worker_alive = self.parent_pipe is not None
+                if should_run and not worker_alive:
                     self.log.info("Background worker process should run but is not running, starting")
                     if self.worker is not None:
                         self.worker_stop()
-                    self.worker_start()
-                if self.worker is not None and self.worker.is_alive() and not should_run:
-                    self.log.info("Background worker process is running but should not run, stopping")
-                    self.worker_stop()
+                    try:
+                        self.worker_start()
+                    except Exception as e:
+                        # keep processing input, like the exit message, while
+                        # retrying the start every second
+                        self.log.error('Failed to start background worker process: {} ({})'.format(type(e).__name__, e))
+                        self.log.debug(traceback.format_exc())
+                        timeout = 1
+                if worker_alive and not should_run and not self.worker_paused:
+                    if self.pausable:
+                        self.log.info("Background worker process is running but should not run, pausing")
+                        self.worker_pause()
+                    else:
+                        self.log.info("Background worker process is running but should not run, stopping")
+                        self.worker_stop()
 
                 # check for input
-                waitable_rfds = [self.q._reader]
-                if should_run:
-                    waitable_rfds.append(self.parent_pipe)
-
-                rfds, _, _ = select.select(waitable_rfds, [], [])
-                for rfd in rfds:
-                    if rfd == self.q._reader:
-                        k, v = self.q.get()
-
-                        if k == 'exit':
-                            return
-                        elif k == 'enabled':
-                            self.config_enabled = v
-                        elif k == "ha-master":
-                            self.ha_master = v
-
-                    if rfd == self.parent_pipe:
+                for key, _ in self.selector.select(timeout):
+                    if key.fileobj == self.q:
+                        # fold all pending messages into our state before
+                        # evaluating it once at the top of the loop
+                        for k, v in self.q.get_all():
+                            if k == 'exit':
+                                return
+                            elif k == 'enabled':
+                                self.config_enabled = v
+
+                    elif key.fileobj == self.ha_event_socket:
+                        ha_master = self._read_ha_events()
+                        if ha_master is not None:
+                            self.ha_master = ha_master
+
+                    elif key.fileobj == self.parent_pipe:
                         # getting a readable event on the pipe should mean the
                         # child is dead - wait for it to die and start again
-                        # we'll restart it at the top of the loop
+                        # we'll restart it at the top of the loop, if it
+                        # should run
                         self.log.info("Child process died")
+                        self._unwatch_worker()
                         if self.worker.is_alive():
                             self.worker.join()
 
@@ -218,10 +357,6 @@ class Process(threading.Thread):
         """stop is called when the supervisor thread should stop and is part of
         the standard Python interface for threading.Thread
         """
-        # stop the HA event listener
-        self.log.debug("{}: stopping HA event listener".format(self.name))
-        self.ha_event_listener.stop()
-
         # stop config CDB subscriber
         self.log.debug("{}: stopping config CDB subscriber".format(self.name))
         if self.config_path is not None:
@@ -240,35 +375,136 @@ class Process(threading.Thread):
 
         self.q.put(('exit', None))
         self.join()
-        self.app.del_running_thread(self.name + ' (Supervisor)')
+        self.app.del_running_thread(self._supervisor_tag)
 
         # stop the background worker process
         self.log.debug("{}: stopping background worker process".format(self.name))
         self.worker_stop()
+        self._close_ha_events()
+        self.selector.close()
+
+
+    def _read_ha_events(self):
+        """Read all HA notifications that are available on the HA event socket
+
+        Returns the resulting HA master state or None if none of the
+        notifications affect it. The socket is left blocking as
+        read_notification must read whole messages, so we only keep reading
+        for as long as the socket is readable.
+        """
+        from _ncs import events
+        ha_master = None
+        try:
+            while True:
+                notification = events.read_notification(self.ha_event_socket)
+                notif_master = _ha_notification_master(notification)
+                if notif_master is not None:
+                    ha_master = notif_master
+
+                ready = [key.fileobj for key, _ in self.selector.select(0)]
+                if self.ha_event_socket not in ready:
+                    return ha_master
+        except Exception:
+            # the socket is most likely broken and would otherwise keep
+            # waking us up, we won't get any more HA events
+            self._close_ha_events()
+            raise
+
+
+    def _close_ha_events(self):
+        """Close the HA event socket
+        """
+        if self.ha_event_socket is not None:
+            self.selector.unregister(self.ha_event_socket)
+            self.ha_event_socket.close()
+            self.ha_event_socket = None
 
 
     def worker_start(self):
         """Starts the background worker process
         """
-        self.log.info("{}: starting the background worker process".format(self.name))
+        self.log.info(self._start_msg)
         # Instead of using the usual worker thread, we use a separate process here.
         # This allows us to terminate the process on package reload / NSO shutdown.
-
-        # using multiprocessing.Pipe which is shareable across a spawned
-        # process, while os.pipe only works, per default over to a forked
-        # child
-        self.parent_pipe, child_pipe = self.mp_ctx.Pipe()
+        # A concurrent.futures process pool won't do either, a running call
+        # cannot be cancelled, we can't tell when the worker dies and the
+        # logging queues can only be handed over when the process is created.
+        # Use pausable to keep a single worker process around instead.
+
+        # using multiprocessing.Pipe which is shareable with a process started
+        # by the forkserver, while os.pipe only works, per default over to a
+        # directly forked child. Data only ever flows in one direction, so
+        # the pipes are not duplex, the first end returned being the reader.
+        parent_pipe, child_pipe = _mp_ctx.Pipe(duplex=False)
+
+        # a pausable worker also gets a control pipe for pause / resume
+        ctrl_child = ctrl_pipe = None
+        if self.pausable:
+            ctrl_child, ctrl_pipe = _mp_ctx.Pipe(duplex=False)
 
         # Instead of calling the bg_fun worker function directly, call our
         # internal wrapper to set up things like inter-process logging through
         # a queue.
-        args = [child_pipe, self.log_queue, self.log_config_q, self.current_log_level, self.bg_fun] + self.bg_fun_args
-        self.worker = self.mp_ctx.Process(target=_bg_wrapper, args=args)
-        self.worker.start()
+        args = [child_pipe, ctrl_child, self.log_queue, self.log_config_q, self.current_log_level, self.bg_fun] + self.bg_fun_args
+        worker = _mp_ctx.Process(target=_bg_wrapper, args=args)
+        _set_forkserver_preload()
+        try:
+            worker.start()
+        except Exception:
+            # e.g. bg_fun is not picklable, the supervisor will retry
+            for pipe in (parent_pipe, ctrl_pipe):
+                if pipe is not None:
+                    pipe.close()
+            raise
+        finally:
+            # close child pipe in parent so only child is in possession of file
+            # handle, which means we get EOF when the child dies
+            child_pipe.close()
+            if ctrl_child is not None:
+                ctrl_child.close()
+
+        # only record the worker once it has started, the supervisor takes an
+        # open parent_pipe to mean the worker is alive
+        self.worker = worker
+        self.parent_pipe = parent_pipe
+        self.ctrl_pipe = ctrl_pipe
+        self.worker_paused = False
+        self.selector.register(self.parent_pipe, selectors.EVENT_READ)
+
+
+    def worker_pause(self):
+        """Tells a pausable background worker process to pause
+        """
+        self.log.info(self._pause_msg)
+        try:
+            self.ctrl_pipe.send('pause')
+        except OSError:
+            self._ctrl_failed()
+            return
+        self.worker_paused = True
+
+
+    def worker_resume(self):
+        """Tells a paused background worker process to resume
+        """
+        self.log.info(self._resume_msg)
+        try:
+            self.ctrl_pipe.send('resume')
+        except OSError:
+            self._ctrl_failed()
+            return
+        self.worker_paused = False
 
-        # close child pipe in parent so only child is in possession of file
-        # handle, which means we get EOF when the child dies
-        child_pipe.close()
+
+    def _ctrl_failed(self):
+        """Handles a failure to send on the control pipe
+
+        The worker has most likely died since we last looked, before we got to
+        see the EOF on its pipe. Treat it as dead so the top of the supervisor
+        loop restarts it if it should run.
+        """
+        self.log.info("{}: background worker process died, control pipe broken".format(self.name))
+        self._unwatch_worker()
 
 
     def worker_stop(self):
@@ -277,12 +513,36 @@ class Process(threading.Thread):
         if self.worker is None:
             self.log.info("{}: asked to stop worker but background worker does not exist".format(self.name))
             return
+        self._unwatch_worker()
         if self.worker.is_alive():
-            self.log.info("{}: stopping the background worker process".format(self.name))
+            self.log.info(self._stop_msg)
             self.worker.terminate()
         self.worker.join(timeout=1)
         if self.worker.is_alive():
-            self.log.error("{}: worker not terminated on time, alive: {}  process: {}".format(self, self.worker.is_alive(), self.worker))
+            # the worker ignored SIGTERM or is stuck, escalate to SIGKILL
+            self.log.warning("{}: worker not terminated on time, killing it".format(self.name))
+            self.worker.kill()
+            self.worker.join(timeout=1)
+        if self.worker.is_alive():
+            self.log.error("{}: worker not killed on time, alive: {}  process: {}".format(self, self.worker.is_alive(), self.worker))
+        else:
+            # release the resources held by the Process object right away
+            self.worker.close()
+        self.worker = None
+        if self.ctrl_pipe is not None:
+            self.ctrl_pipe.close()
+            self.ctrl_pipe = None
+        self.worker_paused = False
+
+
+    def _unwatch_worker(self):
+        """Stop waiting for the background worker process to die and close our
+        end of the pipe
+        """
+        if self.parent_pipe is not None:
+            self.selector.unregister(self.parent_pipe)
+            self.parent_pipe.close()
+            self.parent_pipe = None
 
 
 
@@ -300,6 +560,8 @@ class ConfigSubscriber(object):
     def __init__(self, q, config_path):
         self.q = q
         self.config_path = config_path
+        # last value sent to the supervisor, used to only send changes
+        self.last_enabled = None
 
     def register(self, subscriber):
         subscriber.register(self.config_path, priority=101, iter_obj=self)
@@ -315,7 +577,10 @@ class ConfigSubscriber(object):
         return True
 
     def post_iterate(self, state):
-        self.q.put(("enabled", bool(state['enabled'])))
+        enabled = bool(state['enabled'])
+        if enabled != self.last_enabled:
+            self.last_enabled = enabled
+            self.q.put(("enabled", enabled))
 
 
 class LogConfigSubscriber(object):
@@ -373,89 +638,122 @@ class LogConfigSubscriber(object):
         self.q.put(("log-level", new_level))
 
 
-class HaEventListener(threading.Thread):
-    """HA Event Listener
-    HA events, like HA-mode transitions, are exposed over a notification API.
-    We listen on that and forward relevant messages over the queue to the
-    supervisor which can act accordingly.
-
-    We use a WaitableEvent rather than a threading.Event since the former
-    allows us to wait on it using a select loop. The HA events are received
-    over a socket which can also be waited upon using a select loop, thus
-    making it possible to wait for the two inputs we have using a single select
-    loop.
-    """
-    def __init__(self, app, q):
-        super(HaEventListener, self).__init__()
-        self.app = app
-        self.log = app.log
-        self.q = q
-        self.log.info('{} supervisor: init'.format(self))
-        self.exit_flag = WaitableEvent()
-
-    def run(self):
-        self.app.add_running_thread(self.__class__.__name__ + ' (HA event listener)')
+class WaitableQueue:
+    """A queue for passing messages between threads of the same process that
+    can be waited upon in a select loop, much like WaitableEvent.
 
-        self.log.info('run() HA event listener')
-        from _ncs import events
-        mask = events.NOTIF_HA_INFO
-        event_socket = socket.socket()
-        events.notifications_connect(event_socket, mask, ip='127.0.0.1', port=ncs.PORT)
-        while True:
-            rl, _, _ = select.select([self.exit_flag, event_socket], [], [])
-            if self.exit_flag in rl:
-                event_socket.close()
-                return
+    Items are kept in a deque and for every put a byte is written to a pipe,
+    thus the read end of the pipe is readable for as long as there are items in
+    the queue. The consumer gets all queued items at once, so a burst of
+    messages results in a single wakeup."""
+    def __init__(self):
+        self._read_fd, self._write_fd = os.pipe()
+        os.set_blocking(self._read_fd, False)
+        os.set_blocking(self._write_fd, False)
+        self._lock = threading.Lock()
+        self._items = collections.deque()
+
+    def put(self, item):
+        with self._lock:
+            self._items.append(item)
+        # A full pipe is readable and get_all() returns all items, including
+        # this one, so the consumer is woken up anyway. Never block here, a
+        # stalled consumer must not hold up producers like CDB subscribers.
+        try:
+            os.write(self._write_fd, b'1')
+        except BlockingIOError:
+            pass
 
-            notification = events.read_notification(event_socket)
-            # Can this fail? Could we get a KeyError here? Afraid to catch it
-            # because I don't know what it could mean.
-            ha_notif_type = notification['hnot']['type']
+    def get_all(self):
+        """Remove and return all items in the queue, without blocking
+        """
+        try:
+            os.read(self._read_fd, 4096)
+        except BlockingIOError:
+            pass
+        # there may be more bytes left in the pipe than there are items, which
+        # only means we'll be woken up once more to find an empty queue
+        with self._lock:
+            items = list(self._items)
+            self._items.clear()
+        return items
 
-            if ha_notif_type == events.HA_INFO_IS_MASTER:
-                self.q.put(('ha-master', True))
-            elif ha_notif_type == events.HA_INFO_IS_NONE:
-                self.q.put(('ha-master', False))
-            elif ha_notif_type == events.HA_INFO_SLAVE_INITIALIZED:
-                self.q.put(('ha-master', False))
+    def fileno(self):
+        """Return the FD number of the read side of the pipe, allows this
+        object to be used with select.select()
+        """
+        return self._read_fd
 
-    def stop(self):
-        self.exit_flag.set()
-        self.join()
-        self.app.del_running_thread(self.__class__.__name__ + ' (HA event listener)')
+    def __del__(self):
+        os.close(self._read_fd)
+        os.close(self._write_fd)
 
 
 class WaitableEvent:
     """Provides an abstract object that can be used to resume select loops with
     indefinite waits from another thread or process. This mimics the standard
-    threading.Event interface."""
+    threading.Event interface.
+
+    The supervisor itself no longer uses this, it is kept as a helper for
+    packages that copy this file and need to wake up their own select loops.
+
+    A socket pair is used rather than a pipe as sockets can be waited upon
+    using select on all platforms, including Windows.
+
+    The state is also tracked in a flag so that is_set() doesn't need a system
+    call. The flag only reflects set() and clear() calls made in the same
+    process, use wait() to observe an event set from another process."""
     def __init__(self):
-        self._read_fd, self._write_fd = os.pipe()
+        self._reader, self._writer = socket.socketpair()
+        # non-blocking so that set() and clear() never need to check the
+        # state first: a full socket buffer means we are already set and an
+        # empty one means we are cleared
+        self._reader.setblocking(False)
+        self._writer.setblocking(False)
+        self._sel = selectors.DefaultSelector()
+        self._sel.register(self._reader, selectors.EVENT_READ)
+        self._flag = False
+        # keeps the flag consistent with the content of the socket buffer
+        self._lock = threading.Lock()
 
     def wait(self, timeout=None):
-        rfds, _, _ = select.select([self._read_fd], [], [], timeout)
-        return self._read_fd in rfds
+        return bool(self._sel.select(timeout))
 
     def is_set(self):
-        return self.wait(0)
+        return self._flag
 
     def isSet(self):
-        return self.wait(0)
+        return self._flag
 
     def clear(self):
-        if self.isSet():
-            os.read(self._read_fd, 1)
+        with self._lock:
+            while True:
+                try:
+                    if not self._reader.recv(4096):
+                        break
+                except BlockingIOError:
+                    break
+            self._flag = False
 
     def set(self):
-        if not self.isSet():
-            os.write(self._write_fd, b'1')
+        with self._lock:
+            # a single byte is enough to signal the event, so repeated set()
+            # calls don't pile up data for clear() to drain
+            if self._flag:
+                return
+            self._flag = True
+            try:
+                self._writer.send(b'\x01')
+            except BlockingIOError:
+                pass
 
     def fileno(self):
-        """Return the FD number of the read side of the pipe, allows this
-        object to be used with select.select()
+        """Return the FD number of the read side of the socket pair, allows
+        this object to be used with select.select()
         """
-        return self._read_fd
+        return self._reader.fileno()
 
     def __del__(self):
-        os.close(self._read_fd)
-        os.close(self._write_fd)
+        self._sel.close()
+        self._reader.close()
+        self._writer.close()